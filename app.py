@@ -1,11 +1,14 @@
 import datetime
 import json
+import tempfile
+from collections import Counter
 
 import folium
 import streamlit as st
 from matplotlib import pyplot as plt
 from pymongo import MongoClient
 import os
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 import altair as alt
@@ -19,16 +22,41 @@ from transformers import (
     pipeline,
 )
 
-pretrained = "arthd24/indobert_emotion_base_V2"
+from bundles import MANIFEST_PATH, default_date_range, find_preset, load_manifest, resolve_data_urls, static_url
+from inference import LABEL_COLUMN, SCORE_COLUMN, decode_probs, iter_labeled_chunks
+from timeseries import (
+    GRANULARITY_TITLES,
+    downsample,
+    emotion_buckets,
+    emotion_series,
+    pick_granularity,
+    render_trends_html,
+    to_long_format,
+)
 
-model = AutoModelForSequenceClassification.from_pretrained(pretrained)
-tokenizer = AutoTokenizer.from_pretrained(pretrained)
-sentiment_analysis = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+pretrained = "arthd24/indobert_emotion_base_V2"
 
-MONGO_URI = os.environ.get("MONGO_URI")
+COLLECTION_NAME = 'data-tweet-election-2024-v3'
+PROB_PREFIX = 'prob_'
+MAP_WIDTH = 1300
+MAP_HEIGHT = 500
 APP_TITLE = 'Emotion Analysis Terhadap Kemenangan Paslon Prabowo-Gibran Pada Pemilihan Presiden 2024'
 
 
+# The model is only loaded once a prediction is requested, so dashboard views never pay for it
+@st.cache_resource
+def get_model():
+    model = AutoModelForSequenceClassification.from_pretrained(pretrained)
+    tokenizer = AutoTokenizer.from_pretrained(pretrained)
+    return model, tokenizer
+
+
+@st.cache_resource
+def get_sentiment_pipeline():
+    model, tokenizer = get_model()
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+
+
 # Database connection function
 @st.cache_resource
 def get_database(database_name, connection_str):
@@ -40,24 +68,80 @@ def get_database(database_name, connection_str):
 
 @st.cache_resource
 def get_data():
-    db_viz = get_database("local", MONGO_URI)
-    tweet_collection_labeled = db_viz['data-tweet-election-2024-v3']
-    return pd.DataFrame(list(tweet_collection_labeled.find()))
+    db_viz = get_database("local", os.environ.get("MONGO_URI"))
+    tweet_collection_labeled = db_viz[COLLECTION_NAME]
+    df = pd.DataFrame(list(tweet_collection_labeled.find()))
+
+    # Column order of the stored probability vectors, written by labeler.py
+    meta = db_viz['labeler-meta'].find_one({'_id': COLLECTION_NAME})
+    labels = meta['labels'] if meta else sorted(df['label'].dropna().unique())
+    return attach_probabilities(df, labels)
+
+
+# Cheap check of whether tweets were added, removed or relabeled since the bundles were exported
+@st.cache_data(ttl=300)
+def get_data_fingerprint():
+    db_viz = get_database("local", os.environ.get("MONGO_URI"))
+    tweet_collection_labeled = db_viz[COLLECTION_NAME]
+    latest = tweet_collection_labeled.find_one(sort=[('_id', -1)], projection={'_id': 1})
+    # labeler.py records when it last rewrote labels, a relabel changes neither the count nor the latest _id
+    meta = db_viz['labeler-meta'].find_one({'_id': COLLECTION_NAME}, projection={'labeled_at': 1})
+    return {
+        'tweet_count': tweet_collection_labeled.count_documents({}),
+        'latest_id': str(latest['_id']) if latest else None,
+        'labeled_at': meta['labeled_at'].isoformat() if meta and meta.get('labeled_at') else None,
+    }
+
+
+def data_bounds(df):
+    created_at = pd.to_datetime(df['created_at'])
+    return created_at.min().date(), created_at.max().date()
+
 
+def attach_probabilities(df, labels):
+    # Tweets labeled before probabilities were stored have no vector: their probabilities stay NaN,
+    # so weighted sums skip them, and their confidence falls back to the stored top-label score
+    probs = np.full((len(df), len(labels)), np.nan, dtype=np.float16)
+    has_probs = df['probs'].notna().to_numpy() if 'probs' in df.columns else np.zeros(len(df), dtype=bool)
+    if has_probs.any():
+        probs[has_probs] = decode_probs(df.loc[has_probs, 'probs'], len(labels))
+    df = df.drop(columns='probs', errors='ignore')
 
-def tweet_trends(df):
-    df_date_index = df.copy()
-    df_date_index['created_at'] = pd.to_datetime(df_date_index['created_at'])
-    df_date_index.set_index('created_at', inplace=True)
+    prob_df = pd.DataFrame(probs, columns=[PROB_PREFIX + label for label in labels], index=df.index)
+    df = pd.concat([df, prob_df], axis=1)
+    df['has_probs'] = has_probs
+    score = df['score'].to_numpy(dtype=np.float32) if 'score' in df.columns else np.full(len(df), np.nan)
+    df['confidence'] = np.where(has_probs, probs.max(axis=1), score)
+    return df
 
-    # Resample data to get the count of tweets per day
-    tweets_per_day = df_date_index['full_text'].resample('D').count().reset_index()
-    chart = alt.Chart(tweets_per_day).mark_line(point=True).encode(
-        x=alt.X('created_at:T', title='Tanggal'),
-        y=alt.Y('full_text:Q', title='Jumlah Tweet'),
+
+def confidence_mask(df, min_confidence):
+    # Without a threshold every tweet counts; with one, tweets of unknown confidence are left out
+    if min_confidence <= 0:
+        return pd.Series(True, index=df.index)
+    return df['confidence'] >= min_confidence
+
+
+def probability_columns(df):
+    return [col for col in df.columns if col.startswith(PROB_PREFIX)]
+
+
+@st.cache_data
+def get_emotion_buckets(min_confidence):
+    df = get_data()
+    return emotion_buckets(df[confidence_mask(df, min_confidence)])
+
+
+def tweet_trends(series, granularity):
+    time_title = GRANULARITY_TITLES[granularity]
+    chart = alt.Chart(to_long_format(series)).mark_line(point=len(series) <= 100).encode(
+        x=alt.X('created_at:T', title=time_title),
+        y=alt.Y('count:Q', title='Jumlah Tweet'),
+        color=alt.Color('label:N', title='Emosi'),
         tooltip=[
-            alt.Tooltip('created_at:T', title='Tanggal'),
-            alt.Tooltip('full_text:Q', title='Jumlah Tweet')
+            alt.Tooltip('created_at:T', title=time_title),
+            alt.Tooltip('label:N', title='Emosi'),
+            alt.Tooltip('count:Q', title='Jumlah Tweet')
         ]
     ).properties(
         width=800,
@@ -71,8 +155,7 @@ def tweet_trends(df):
     return chart
 
 
-@st.cache_resource()
-def display_map(df):
+def build_map(df):
     map = folium.Map(location=[-3.46955730306146, 118.69628906250001],
                      zoom_start=5,
                      tiles="CartoDB Positron")
@@ -131,13 +214,25 @@ def display_map(df):
         )
     )
 
-    folium_static(map, width=1300, height=500)
+    return map
 
 
-def emotion_distribusion(df):
+@st.cache_resource()
+def display_map(df):
+    folium_static(build_map(df), width=MAP_WIDTH, height=MAP_HEIGHT)
+
+
+def emotion_distribusion(df, weighted=False):
     df = df.copy()
-    label_counts = df['label'].value_counts().reset_index()
-    label_counts.columns = ['label', 'count']
+    if weighted:
+        # Expected number of tweets per emotion, summed from the stored probability vectors
+        prob_cols = probability_columns(df)
+        label_counts = df[prob_cols].astype(np.float32).sum().reset_index()
+        label_counts.columns = ['label', 'count']
+        label_counts['label'] = label_counts['label'].str.removeprefix(PROB_PREFIX)
+    else:
+        label_counts = df['label'].value_counts().reset_index()
+        label_counts.columns = ['label', 'count']
 
     chart = alt.Chart(label_counts).mark_bar().encode(
         x=alt.X('count', title="Jumlah"),
@@ -148,14 +243,20 @@ def emotion_distribusion(df):
     return chart
 
 
-def map_data_manipulation(df):
+def map_data_manipulation(df, weighted=False):
     df = df.copy()
 
-    # Group by 'location' and 'label' and count the occurrences
-    grouped = df.groupby(['location', 'label']).size().reset_index(name='count')
+    if weighted:
+        # Sum the probability vectors per location instead of counting hard labels
+        prob_cols = probability_columns(df)
+        pivot_table = df[prob_cols].astype(np.float32).groupby(df['location']).sum().round(1)
+        pivot_table.columns = [col.removeprefix(PROB_PREFIX) for col in prob_cols]
+    else:
+        # Group by 'location' and 'label' and count the occurrences
+        grouped = df.groupby(['location', 'label']).size().reset_index(name='count')
 
-    # Pivot the table to get the desired format
-    pivot_table = grouped.pivot(index='location', columns='label', values='count').fillna(0)
+        # Pivot the table to get the desired format
+        pivot_table = grouped.pivot(index='location', columns='label', values='count').fillna(0)
 
     # Add the total count for each location
     pivot_table['location_count'] = pivot_table.sum(axis=1)
@@ -173,46 +274,128 @@ def map_data_manipulation(df):
     return pivot_table
 
 
-def generate_wordcloud(text):
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    plt.figure(figsize=(10, 5))
+def word_count_distribution(df):
+    # Count tweets per word count first so the chart ships one row per distinct length, not per tweet
+    word_counts = df['full_text'].str.split().str.len().value_counts().reset_index()
+    word_counts.columns = ['word_count', 'count']
+    chart = alt.Chart(word_counts).mark_bar().encode(
+        alt.X('word_count', bin=alt.Bin(maxbins=30), title='Jumlah Kata per Tweet'),
+        alt.Y('sum(count)', title='Frekuensi')
+    ).properties(
+        width=600,
+        height=400
+    )
+    return chart
+
+
+def wordcloud_figure(text):
+    # WordCloud.generate raises on text without any word left after stopword removal
+    wordcloud = WordCloud(width=800, height=400, background_color='white')
+    frequencies = wordcloud.process_text(text)
+    if not frequencies:
+        return None
+    wordcloud.generate_from_frequencies(frequencies)
+    fig = plt.figure(figsize=(10, 5))
     plt.imshow(wordcloud, interpolation='bilinear')
     plt.axis('off')
     plt.tight_layout(pad=0)
-    st.pyplot(plt)
+    return fig
 
 
 def generate_wordcloud(text):
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.tight_layout(pad=0)
-    st.pyplot(plt)
+    fig = wordcloud_figure(text)
+    if fig is None:
+        st.info("Tidak ada kata untuk ditampilkan.")
+    else:
+        st.pyplot(fig)
 
 
 def predict_sentiment(text):
-    result = sentiment_analysis(text)
+    result = get_sentiment_pipeline()(text)
     st.write(f"Prediksi sentimen: {result[0]['label']} ({result[0]['score'] * 100:.3f}%)")
 
 
-def tweet_trends_d3(df):
-    df_date_index = df.copy()
-    df_date_index['created_at'] = pd.to_datetime(df_date_index['created_at'])
-    df_date_index.set_index('created_at', inplace=True)
-    tweets_per_day = df_date_index['full_text'].resample('D').count().reset_index()
+# Uploads that cannot be read as a CSV: an empty file, an encoding other than UTF-8 or a malformed row
+CSV_READ_ERRORS = (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError)
+
 
-    # Convert data to JSON
-    data_json = tweets_per_day.to_json(orient='records')
+def csv_error_message(error):
+    if isinstance(error, pd.errors.EmptyDataError):
+        return "File kosong, unggah file CSV yang berisi data."
+    if isinstance(error, UnicodeDecodeError):
+        return "File tidak dapat dibaca, simpan ulang file dengan encoding UTF-8 (CSV UTF-8)."
+    return f"Format file CSV tidak valid: {error}"
 
-    # Read HTML file
-    with open("./template/tweet_trends.html", "r") as file:
-        html_template = file.read()
 
-    # Render HTML with data
-    html_template = html_template.replace('{{ data }}', json.dumps(data_json))
-    # components.html(html_template, scrolling=True, height=500)
-    st.markdown(html_template, unsafe_allow_html=True)
+def predict_file(uploaded_file, text_column):
+    # Rough row count for the progress bar
+    total_rows = max(sum(1 for _ in uploaded_file) - 1, 1)
+    uploaded_file.seek(0)
+
+    progress = st.progress(0.0, text="Memproses file...")
+    summary_placeholder = st.empty()
+    preview_placeholder = st.empty()
+    label_counts = Counter()
+    processed_rows = 0
+
+    # Labeled chunks are appended to a temporary file so only one chunk of results is held at a time.
+    # The upload itself and the download are still fully in memory, bounded by server.maxUploadSize.
+    model, tokenizer = get_model()
+    with tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False) as output:
+        output_path = output.name
+    try:
+        try:
+            for chunk in iter_labeled_chunks(uploaded_file, model, tokenizer, text_column):
+                chunk.to_csv(output_path, mode='a', header=processed_rows == 0, index=False)
+                processed_rows += len(chunk)
+                label_counts.update(chunk[LABEL_COLUMN])
+
+                progress.progress(min(processed_rows / total_rows, 1.0),
+                                  text=f"{processed_rows:,} teks diproses")
+                summary = pd.DataFrame(label_counts.most_common(), columns=['label', 'count'])
+                summary_placeholder.dataframe(summary, hide_index=True)
+                preview_placeholder.dataframe(chunk[[text_column, LABEL_COLUMN, SCORE_COLUMN]].tail(10),
+                                              hide_index=True)
+        except CSV_READ_ERRORS as error:
+            # A malformed row can show up in any chunk, the partial result is not offered for download
+            progress.empty()
+            st.error(f"{csv_error_message(error)} ({processed_rows:,} teks sempat diproses)")
+            return
+
+        progress.progress(1.0, text=f"Selesai, {processed_rows:,} teks diproses")
+        # download_button reads the file when it is called, so it can be removed right after
+        with open(output_path, 'rb') as file:
+            st.download_button("Unduh Hasil Prediksi",
+                               data=file,
+                               file_name=f"labeled_{uploaded_file.name}",
+                               mime="text/csv")
+    finally:
+        os.remove(output_path)
+
+
+# Keyed on the manifest's modification time so a new export is picked up without a restart
+@st.cache_data
+def get_manifest(modified_at):
+    return load_manifest()
+
+
+# Bundle files carry a content hash in their name, so a path always maps to the same content.
+# Streamlit serves app/static files other than images as text/plain, so the html pages are embedded
+@st.cache_data
+def read_bundle_file(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+@st.cache_data
+def read_bundle_spec(path):
+    # Only the small spec goes through the app, its data is fetched by the browser from the static url
+    with open(path, 'r', encoding='utf-8') as file:
+        return resolve_data_urls(json.load(file))
+
+
+def tweet_trends_d3(series):
+    components.html(render_trends_html(series), scrolling=True, height=450)
 
 
 def main():
@@ -236,41 +419,71 @@ def main():
                      )
     st.markdown(f"<h1 style='text-align: center;'>{APP_TITLE}</h1>", unsafe_allow_html=True)
     st.markdown("""<style> .ef3psqc5 {display: none;}</style>""", unsafe_allow_html=True)
-    df = get_data()
-
-    # Get the current date
-    current_date = datetime.date.today()
-
-    # Get the current year
-    current_year = current_date.year
-
-    # Get the first date of the current year
-    first_date_of_year = datetime.date(current_year, 1, 1)
-
-    # Get the first date of the first month of the current year
-    first_date_of_first_month = datetime.date(current_year, 1, 1)
+    # Pre-rendered bundles (see export_static.py) let common ranges load without touching the data
+    manifest = get_manifest(os.path.getmtime(MANIFEST_PATH) if os.path.exists(MANIFEST_PATH) else None)
+    if manifest and manifest.get('fingerprint') != get_data_fingerprint():
+        # Tweets were added or removed after the last export, the bundles no longer match the data
+        manifest = None
+
+    # Once the live data has been loaded in this session its date bounds are used, not the manifest's
+    if manifest and not st.session_state.get('use_live_bounds'):
+        df = None
+        min_date = datetime.date.fromisoformat(manifest['min_date'])
+        max_date = datetime.date.fromisoformat(manifest['max_date'])
+    else:
+        df = get_data()
+        min_date, max_date = data_bounds(df)
+    first_date_of_first_month, _ = default_date_range(min_date, max_date)
 
     st.sidebar.header('Pilih Rentang Tanggal Data')
-    min_date = pd.to_datetime(df['created_at']).min().date()
-    max_date = pd.to_datetime(df['created_at']).max().date()
     start_date = st.sidebar.date_input("Tanggal Awal", min_value=min_date, max_value=max_date, value=first_date_of_first_month)
     end_date = st.sidebar.date_input("Tanggal Akhir", min_value=min_date, max_value=max_date, value=max_date)
-
-
-    filtered_df = df[(pd.to_datetime(df['created_at']).dt.date >= start_date) &
-                     (pd.to_datetime(df['created_at']).dt.date <= end_date)]
-
-    tweet_trends_chart = tweet_trends(filtered_df)
-    emotion_distribusion_chart = emotion_distribusion(filtered_df)
+    st.sidebar.header('Keyakinan Prediksi')
+    min_confidence = st.sidebar.slider("Ambang keyakinan minimum", min_value=0.0, max_value=1.0, value=0.0, step=0.05)
+    weighted = st.sidebar.checkbox("Hitung berdasarkan bobot probabilitas", value=False)
+
+    bundle = None
+    if manifest and min_confidence == 0 and not weighted:
+        bundle = find_preset(manifest, start_date, end_date)
+
+    if bundle is None and df is None:
+        df = get_data()
+        st.session_state['use_live_bounds'] = True
+        if data_bounds(df) != (min_date, max_date):
+            st.rerun()
+
+    if bundle is None:
+        filtered_df = df[(pd.to_datetime(df['created_at']).dt.date >= start_date) &
+                         (pd.to_datetime(df['created_at']).dt.date <= end_date) &
+                         confidence_mask(df, min_confidence)]
+
+        granularity = pick_granularity(start_date, end_date)
+        trend_series = downsample(emotion_series(get_emotion_buckets(min_confidence), start_date, end_date, granularity))
+        tweet_trends_chart = tweet_trends(trend_series, granularity)
+        if weighted:
+            missing_probs = int((~filtered_df['has_probs']).sum())
+            if missing_probs:
+                st.sidebar.caption(f"{missing_probs:,} tweet belum memiliki vektor probabilitas "
+                                   f"dan tidak ikut dihitung pada mode bobot.")
+            aggregate_df = filtered_df[filtered_df['has_probs']]
+        else:
+            aggregate_df = filtered_df
+        emotion_distribusion_chart = emotion_distribusion(aggregate_df, weighted)
+        map_data = map_data_manipulation(aggregate_df, weighted)
 
     col1, col2 = st.columns([2, 1], gap="medium")
-    map_data = map_data_manipulation(filtered_df)
 
     with col1:
         st.subheader("Peta Distribusi Jumlah Tweet di Indonesia Berdasarkan Provinsi")
-        display_map(map_data)
+        if bundle:
+            components.html(read_bundle_file(bundle['files']['map']), width=MAP_WIDTH, height=MAP_HEIGHT)
+        else:
+            display_map(map_data)
         st.subheader("Jumlah Tweet Dari Waktu ke Waktu")
-        st.altair_chart(tweet_trends_chart, use_container_width=True)
+        if bundle:
+            st.vega_lite_chart(read_bundle_spec(bundle['files']['trends']), use_container_width=True)
+        else:
+            st.altair_chart(tweet_trends_chart, use_container_width=True)
         st.header('Prediksi Sentimen teks')
         user_input = st.text_area("Masukkan teks untuk prediksi sentimen", "")
         if st.button("Prediksi Sentimen"):
@@ -278,23 +491,50 @@ def main():
                 sentiment = predict_sentiment(user_input)
             else:
                 st.write("Masukkan teks terlebih dahulu.")
-        tweet_trends_d3(filtered_df)
+        st.header('Prediksi Sentimen dari File')
+        uploaded_file = st.file_uploader("Unggah file CSV berisi teks", type=['csv'])
+        st.caption(f"Ukuran file maksimum {st.get_option('server.maxUploadSize')} MB")
+        if uploaded_file is not None:
+            try:
+                columns = pd.read_csv(uploaded_file, nrows=0).columns.tolist()
+                read_error = None
+            except CSV_READ_ERRORS as error:
+                columns, read_error = [], error
+            uploaded_file.seek(0)
+            existing = [col for col in (LABEL_COLUMN, SCORE_COLUMN) if col in columns]
+            if read_error is not None:
+                st.error(csv_error_message(read_error))
+            elif existing:
+                st.error(f"File sudah memiliki kolom {existing}, ganti nama kolom tersebut terlebih dahulu.")
+            else:
+                text_column = st.selectbox("Kolom teks", columns,
+                                           index=columns.index('full_text') if 'full_text' in columns else 0)
+                if st.button("Prediksi File"):
+                    predict_file(uploaded_file, text_column)
+        if bundle:
+            components.html(read_bundle_file(bundle['files']['trends_d3']), scrolling=True, height=450)
+        else:
+            tweet_trends_d3(trend_series)
     with col2:
         st.subheader("Distribusi Jumlah Emosi dari tweet")
-        st.altair_chart(emotion_distribusion_chart, use_container_width=True)
+        if bundle:
+            st.vega_lite_chart(read_bundle_spec(bundle['files']['emotions']), use_container_width=True)
+        else:
+            st.altair_chart(emotion_distribusion_chart, use_container_width=True)
         st.subheader("Distribusi Jumlah Kata dari Tweet")
-        filtered_df['word_count'] = filtered_df['full_text'].apply(lambda x: len(x.split()))
-        word_count_chart = alt.Chart(filtered_df).mark_bar().encode(
-            alt.X('word_count', bin=alt.Bin(maxbins=30), title='Jumlah Kata per Tweet'),
-            alt.Y('count()', title='Frekuensi')
-        ).properties(
-            width=600,
-            height=400
-        )
-        st.altair_chart(word_count_chart, use_container_width=True)
+        if bundle:
+            st.vega_lite_chart(read_bundle_spec(bundle['files']['word_count']), use_container_width=True)
+        else:
+            st.altair_chart(word_count_distribution(filtered_df), use_container_width=True)
         st.subheader("Word Cloud of Tweets")
-        all_text = " ".join(tweet for tweet in filtered_df['full_text'])
-        generate_wordcloud(all_text)
+        if bundle and 'wordcloud' not in bundle['files']:
+            st.info("Tidak ada kata untuk ditampilkan.")
+        elif bundle:
+            st.markdown(f'<img src="{static_url(bundle["files"]["wordcloud"])}" style="width: 100%">',
+                        unsafe_allow_html=True)
+        else:
+            all_text = " ".join(tweet for tweet in filtered_df['full_text'])
+            generate_wordcloud(all_text)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+from inference import MAX_LENGTH, label_names, predict_logits
+from metrics import classification_metrics
+
+PRETRAINED = "arthd24/indobert_emotion_base_V2"
+BACKENDS = ["torch", "torch-int8", "pipeline"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure model quality and CPU throughput on a labeled CSV")
+    parser.add_argument("--data", required=True, help="Labeled CSV with a text and a label column")
+    parser.add_argument("--sep", default=",")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="label")
+    parser.add_argument("--model", nargs="+", default=[PRETRAINED], help="Hub ids or local model directories")
+    parser.add_argument("--backend", nargs="+", default=["torch"], choices=BACKENDS)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, torch.get_num_threads()])
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--speed-samples", type=int, default=512,
+                        help="Number of texts timed per batch size and thread count")
+    parser.add_argument("--output", default="benchmark_results.json")
+    return parser.parse_args()
+
+
+def load_backend(model_path, backend, max_length):
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    if backend == "torch-int8":
+        # Dynamic quantization of the linear layers, weights stored as int8
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if backend == "pipeline":
+        classifier = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+        label2id = model.config.label2id
+
+        def predict(texts, batch_size):
+            results = classifier(texts, batch_size=batch_size, truncation=True, max_length=max_length)
+            return np.array([label2id[result['label']] for result in results])
+    else:
+        def predict(texts, batch_size):
+            return predict_logits(texts, model, tokenizer, batch_size=batch_size, max_length=max_length).argmax(axis=1)
+
+    return model, predict
+
+
+def encode_labels(labels, model):
+    # Labels may be given as class names or as class ids
+    if pd.api.types.is_float_dtype(labels) and (labels % 1 == 0).all():
+        # read_csv turns an id column into floats when a row is blank
+        labels = labels.astype(int)
+    if pd.api.types.is_integer_dtype(labels):
+        y_true = labels.to_numpy()
+        invalid = sorted(set(y_true[(y_true < 0) | (y_true >= model.config.num_labels)].tolist()))
+        if invalid:
+            raise ValueError(f"Label ids {invalid} out of range, expected 0..{model.config.num_labels - 1}")
+        return y_true
+    y_true = labels.astype(str).map(model.config.label2id)
+    if y_true.isna().any():
+        unknown = sorted(labels[y_true.isna()].astype(str).unique())
+        raise ValueError(f"Unknown labels {unknown}, expected one of {sorted(model.config.label2id)}")
+    return y_true.astype(int).to_numpy()
+
+
+def measure_latency(predict, texts, batch_size):
+    # Batches are sent in file order, the way requests arrive, and timed one by one
+    predict(texts[:batch_size], batch_size)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        batch_start = time.perf_counter()
+        predict(texts[i:i + batch_size], batch_size)
+        latencies.append(time.perf_counter() - batch_start)
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "batch_size": batch_size,
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "tweets_per_second": len(texts) / elapsed,
+    }
+
+
+def run(model_path, backend, df, args):
+    model, predict = load_backend(model_path, backend, args.max_length)
+    texts = df[args.text_column].astype(str).tolist()
+    y_true = encode_labels(df[args.label_column], model)
+
+    quality = classification_metrics(y_true, predict(texts, max(args.batch_sizes)), model.config.num_labels)
+
+    speed = []
+    speed_texts = texts[:args.speed_samples]
+    default_threads = torch.get_num_threads()
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            result = measure_latency(predict, speed_texts, batch_size)
+            speed.append({"threads": threads, **result})
+            print(f"{model_path} [{backend}] threads={threads} batch={batch_size}: "
+                  f"{result['tweets_per_second']:.1f} tweets/s, p95 {result['latency_p95_ms']:.1f} ms")
+    torch.set_num_threads(default_threads)
+
+    return {
+        "model": model_path,
+        "backend": backend,
+        "labels": label_names(model),
+        "quality": quality,
+        "speed": speed,
+    }
+
+
+def main():
+    args = parse_args()
+    df = pd.read_csv(args.data, sep=args.sep, encoding="utf-8", usecols=[args.text_column, args.label_column])
+    df = df.dropna().reset_index(drop=True)
+
+    runs = [run(model_path, backend, df, args) for model_path in args.model for backend in args.backend]
+    results = {
+        "data": os.path.abspath(args.data),
+        "samples": len(df),
+        "speed_samples": min(args.speed_samples, len(df)),
+        "max_length": args.max_length,
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "runs": runs,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for result in runs:
+        quality = result["quality"]
+        print(f"{result['model']} [{result['backend']}]: accuracy {quality['accuracy']:.4f}, "
+              f"f1_micro {quality['f1_micro']:.4f}, f1_macro {quality['f1_macro']:.4f}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
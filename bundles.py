@@ -0,0 +1,114 @@
+import datetime
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+import pandas as pd
+
+STATIC_DIR = "static"
+BUNDLE_DIR = "static/bundles"
+MANIFEST_PATH = os.path.join(BUNDLE_DIR, "manifest.json")
+# File names written by write_hashed: name.<12 hex digits>.ext
+HASHED_NAME = re.compile(r"^[\w-]+\.[0-9a-f]{12}\.[\w.]+$")
+# Bump when the bundle layout changes so old manifests are regenerated
+BUNDLE_FORMAT = 3
+
+
+def default_date_range(min_date, max_date):
+    # Landing view: from the first day of the latest tweet's year up to the latest tweet
+    first_date_of_first_month = datetime.date(max_date.year, 1, 1)
+    return max(first_date_of_first_month, min_date), max_date
+
+
+def date_presets(min_date, max_date):
+    presets = {
+        'default': default_date_range(min_date, max_date),
+        'all-time': (min_date, max_date),
+        'last-7-days': (max(min_date, max_date - datetime.timedelta(days=6)), max_date),
+    }
+    for month_start in pd.date_range(min_date.replace(day=1), max_date, freq='MS').date:
+        month_end = (pd.Timestamp(month_start) + pd.offsets.MonthEnd(0)).date()
+        presets[f"month-{month_start:%Y-%m}"] = (max(month_start, min_date), min(month_end, max_date))
+    return presets
+
+
+def data_version(df, columns):
+    # Changes whenever a tweet is added, removed or relabeled
+    hashed = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+    digest = hashlib.sha256(hashed.to_numpy().tobytes())
+    digest.update(f"{BUNDLE_FORMAT}|{len(df)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def write_hashed(directory, name, extension, content):
+    # The content hash in the file name lets a CDN cache every file forever
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    path = os.path.join(directory, f"{name}.{digest}.{extension}")
+    if not os.path.exists(path):
+        with open(path, 'wb') as file:
+            file.write(content)
+    return path
+
+
+def externalize_datasets(spec, directory, name):
+    # Move the inline Vega-Lite datasets to their own files so the browser fetches them as static files
+    paths = {}
+    for dataset, values in spec.pop('datasets', {}).items():
+        paths[dataset] = write_hashed(directory, f"{name}-data", 'json', json.dumps(values, default=str))
+
+    def link(node):
+        if isinstance(node, dict):
+            if node.get('name') in paths and set(node) <= {'name', 'format'}:
+                node['url'] = paths[node.pop('name')]
+            for value in node.values():
+                link(value)
+        elif isinstance(node, list):
+            for value in node:
+                link(value)
+
+    link(spec)
+    return spec, list(paths.values())
+
+
+def static_url(path):
+    # Files under ./static are served by Streamlit at app/static, or by a CDN when STATIC_BASE_URL is set.
+    # Only used for the png and json bundle files, Streamlit serves html there as text/plain
+    base = os.environ.get("STATIC_BASE_URL", "app/static").rstrip('/')
+    return posixpath.join(base, *os.path.relpath(path, STATIC_DIR).split(os.sep))
+
+
+def resolve_data_urls(spec):
+    # Spec data urls are stored as file paths and turned into static urls when rendered
+    if isinstance(spec, dict):
+        return {key: static_url(value) if key == 'url' else resolve_data_urls(value) for key, value in spec.items()}
+    if isinstance(spec, list):
+        return [resolve_data_urls(value) for value in spec]
+    return spec
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        return None
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def find_preset(manifest, start_date, end_date):
+    for preset in manifest['presets'].values():
+        if preset['start'] == start_date.isoformat() and preset['end'] == end_date.isoformat():
+            return preset
+    return None
@@ -0,0 +1,304 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from datasets import Dataset, load_from_disk
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    DataCollatorWithPadding,
+    Trainer,
+    TrainingArguments,
+)
+
+from inference import measure_throughput, predict_logits, predict_proba
+from metrics import classification_metrics
+from train import file_hash, load_labeled_csv, tokenizer_hash
+
+TEACHER_MODEL = "arthd24/indobert_emotion_base_V2"
+MAX_LENGTH = 60
+CACHE_DIR = ".cache/distill"
+
+# Half the depth and width of the base-size teacher. Heads keep the teacher's size (64) so whole
+# teacher heads can be copied into the student
+STUDENT_MODEL = dict(num_hidden_layers=6, hidden_size=384, num_attention_heads=6, intermediate_size=1536)
+SMOKE_STUDENT_MODEL = dict(num_hidden_layers=2, hidden_size=128, num_attention_heads=2, intermediate_size=256)
+
+SMOKE_CORPUS_SAMPLES = 256
+SMOKE_EVAL_SAMPLES = 128
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Distill the emotion classifier into a smaller student model")
+    parser.add_argument("--corpus", required=True, help="CSV of unlabeled tweets the teacher labels")
+    parser.add_argument("--corpus-sep", default=",")
+    parser.add_argument("--corpus-text-column", default="full_text")
+    parser.add_argument("--eval-data", required=True, help="Labeled CSV used for the comparison report")
+    parser.add_argument("--eval-sep", default="\t")
+    parser.add_argument("--eval-text-column", default="Tweet")
+    parser.add_argument("--eval-label-column", default="Label")
+    parser.add_argument("--teacher", default=TEACHER_MODEL)
+    parser.add_argument("--student-model", default=None,
+                        help="Pretrained compact checkpoint sharing the teacher's vocabulary to start the student "
+                             "from, instead of the teacher's own weights")
+    parser.add_argument("--output-dir", default="indobert_emotion_student")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.7,
+                        help="Weight of the soft-label loss, the rest goes to the teacher's hard labels")
+    parser.add_argument("--epochs", type=float, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads(),
+                        help="CPU threads used when measuring throughput")
+    parser.add_argument("--smoke", action="store_true",
+                        help="Tiny CPU run: few samples, one epoch and a very small student")
+    return parser.parse_args()
+
+
+def load_corpus(path, sep, text_column, max_samples=None):
+    df = pd.read_csv(path, sep=sep, encoding="utf-8", usecols=[text_column])
+    df = df.dropna().drop_duplicates().rename(columns={text_column: "text"})
+    df["text"] = df["text"].astype(str)
+    if max_samples:
+        df = df.sample(n=min(max_samples, len(df)), random_state=0)
+    return df.reset_index(drop=True)
+
+
+def soft_labeled_corpus(df, teacher, tokenizer, args, data_hash):
+    # Teacher logits only depend on the teacher, the corpus text and the tokenization settings
+    settings = [args.corpus_sep, args.corpus_text_column, args.max_length, args.smoke, len(df)]
+    key = hashlib.sha256(
+        f"{data_hash}|{args.teacher}|{tokenizer_hash(tokenizer)}|{json.dumps(settings)}".encode()
+    ).hexdigest()[:16]
+    path = os.path.join(args.cache_dir, key)
+    if os.path.isdir(path):
+        print(f"Using cached teacher logits {path}")
+        return load_from_disk(path)
+
+    logits = predict_logits(df["text"].tolist(), teacher, tokenizer,
+                            batch_size=args.batch_size * 2, max_length=args.max_length)
+    dataset = Dataset.from_dict({
+        "text": df["text"].tolist(),
+        "teacher_logits": logits.tolist(),
+        "labels": logits.argmax(axis=1).tolist(),
+    })
+
+    def preprocess_fn(data):
+        return tokenizer(data["text"], max_length=args.max_length, truncation=True)
+
+    dataset = dataset.map(preprocess_fn, batched=True, remove_columns=["text"])
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    dataset.save_to_disk(tmp_path)
+    os.replace(tmp_path, path)
+    return load_from_disk(path)
+
+
+def build_student(teacher, args):
+    if args.student_model:
+        student = AutoModelForSequenceClassification.from_pretrained(
+            args.student_model, num_labels=teacher.config.num_labels, id2label=teacher.config.id2label,
+            label2id=teacher.config.label2id, ignore_mismatched_sizes=True
+        )
+        return student, {"method": "pretrained", "checkpoint": args.student_model}
+
+    config = copy.deepcopy(teacher.config)
+    for key, value in (SMOKE_STUDENT_MODEL if args.smoke else STUDENT_MODEL).items():
+        setattr(config, key, value)
+    # Same architecture class as the teacher, so AutoModelForSequenceClassification loads it unchanged
+    student = AutoModelForSequenceClassification.from_config(config)
+    return student, init_student_from_teacher(student, teacher)
+
+
+def init_student_from_teacher(student, teacher):
+    """Copy every other teacher layer into the narrower student.
+
+    The hidden dimension is projected onto the principal directions of the teacher's word
+    embeddings, attention heads and feed-forward units are kept by the norm of their output weights.
+    """
+    if teacher.config.model_type != "bert":
+        raise ValueError(f"Teacher initialization supports BERT models, got {teacher.config.model_type}")
+    s_config, t_config = student.config, teacher.config
+    head_size = t_config.hidden_size // t_config.num_attention_heads
+    if s_config.hidden_size // s_config.num_attention_heads != head_size:
+        raise ValueError("Student attention heads must have the same size as the teacher's")
+
+    t = teacher.state_dict()
+    n_layers = s_config.num_hidden_layers
+    teacher_layers = [(i + 1) * t_config.num_hidden_layers // n_layers - 1 for i in range(n_layers)]
+
+    with torch.no_grad():
+        # Orthonormal basis (teacher hidden x student hidden) that keeps most of the embedding variance
+        embeddings = t["bert.embeddings.word_embeddings.weight"].float()
+        _, vectors = torch.linalg.eigh(embeddings.T @ embeddings)
+        p = vectors[:, -s_config.hidden_size:].flip(1)
+
+        def vector(name):
+            return t[name] @ p
+
+        def layer_norm(prefix):
+            # Scales are averaged over the directions each student unit mixes, shifts are projected
+            return {prefix + ".weight": (p ** 2).T @ t[prefix + ".weight"], prefix + ".bias": vector(prefix + ".bias")}
+
+        s = {name: t[name] @ p for name in ("bert.embeddings.word_embeddings.weight",
+                                            "bert.embeddings.position_embeddings.weight",
+                                            "bert.embeddings.token_type_embeddings.weight")}
+        s.update(layer_norm("bert.embeddings.LayerNorm"))
+
+        for i, j in enumerate(teacher_layers):
+            src, dst = f"bert.encoder.layer.{j}.", f"bert.encoder.layer.{i}."
+
+            out_weight = t[src + "attention.output.dense.weight"]
+            head_norms = out_weight.reshape(t_config.hidden_size, -1, head_size).norm(dim=(0, 2))
+            heads = head_norms.topk(s_config.num_attention_heads).indices.sort().values
+            rows = (heads[:, None] * head_size + torch.arange(head_size)).reshape(-1)
+            for name in ("query", "key", "value"):
+                s[dst + f"attention.self.{name}.weight"] = t[src + f"attention.self.{name}.weight"][rows] @ p
+                s[dst + f"attention.self.{name}.bias"] = t[src + f"attention.self.{name}.bias"][rows]
+            s[dst + "attention.output.dense.weight"] = p.T @ out_weight[:, rows]
+            s[dst + "attention.output.dense.bias"] = p.T @ t[src + "attention.output.dense.bias"]
+            s.update({dst + key[len(src):]: value
+                      for key, value in layer_norm(src + "attention.output.LayerNorm").items()})
+
+            ffn_out = t[src + "output.dense.weight"]
+            units = ffn_out.norm(dim=0).topk(s_config.intermediate_size).indices.sort().values
+            s[dst + "intermediate.dense.weight"] = t[src + "intermediate.dense.weight"][units] @ p
+            s[dst + "intermediate.dense.bias"] = t[src + "intermediate.dense.bias"][units]
+            s[dst + "output.dense.weight"] = p.T @ ffn_out[:, units]
+            s[dst + "output.dense.bias"] = p.T @ t[src + "output.dense.bias"]
+            s.update({dst + key[len(src):]: value for key, value in layer_norm(src + "output.LayerNorm").items()})
+
+        s["bert.pooler.dense.weight"] = p.T @ t["bert.pooler.dense.weight"] @ p
+        s["bert.pooler.dense.bias"] = p.T @ t["bert.pooler.dense.bias"]
+        s["classifier.weight"] = t["classifier.weight"] @ p
+        s["classifier.bias"] = t["classifier.bias"]
+
+    missing, _ = student.load_state_dict(s, strict=False)
+    return {
+        "method": "teacher",
+        "teacher_layers": teacher_layers,
+        "hidden_projection": f"{t_config.hidden_size} -> {s_config.hidden_size} (principal directions of the word embeddings)",
+        "not_initialized": [name for name in missing if not name.endswith("_ids")],
+    }
+
+
+class DistillationTrainer(Trainer):
+    def __init__(self, *args, temperature=2.0, alpha=0.7, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        teacher_logits = inputs.pop("teacher_logits")
+        outputs = model(**inputs)
+
+        # Soft-label loss is scaled by T^2 so its gradients stay comparable to the hard-label loss
+        t = self.temperature
+        soft_loss = F.kl_div(F.log_softmax(outputs.logits / t, dim=-1),
+                             F.softmax(teacher_logits / t, dim=-1),
+                             reduction="batchmean") * t * t
+        loss = self.alpha * soft_loss + (1 - self.alpha) * outputs.loss
+        return (loss, outputs) if return_outputs else loss
+
+
+def model_summary(model, tokenizer, eval_df, args):
+    texts = eval_df["text"].tolist()
+    label2id = model.config.label2id
+    y_true = eval_df["label_name"].map(label2id)
+    if y_true.isna().any():
+        raise ValueError(f"Eval labels must be one of {sorted(label2id)}")
+
+    probs = predict_proba(texts, model, tokenizer, batch_size=args.batch_size, max_length=args.max_length)
+    scores = classification_metrics(y_true.astype(int), probs.argmax(axis=1), model.config.num_labels)
+    return {
+        "accuracy": scores["accuracy"],
+        "f1_micro": scores["f1_micro"],
+        "f1_macro": scores["f1_macro"],
+        "parameters": sum(p.numel() for p in model.parameters()),
+        "tweets_per_second": measure_throughput(texts, model, tokenizer,
+                                                batch_size=args.batch_size, max_length=args.max_length),
+    }, probs.argmax(axis=1)
+
+
+def main():
+    args = parse_args()
+    if args.smoke:
+        args.epochs = 1
+        args.batch_size = 8
+
+    tokenizer = AutoTokenizer.from_pretrained(args.teacher)
+    teacher = AutoModelForSequenceClassification.from_pretrained(args.teacher)
+
+    corpus = load_corpus(args.corpus, args.corpus_sep, args.corpus_text_column,
+                         max_samples=SMOKE_CORPUS_SAMPLES if args.smoke else None)
+    # Label the corpus on the GPU when there is one, the comparison below runs on CPU
+    device = "cuda" if torch.cuda.is_available() and not args.smoke else "cpu"
+    dataset = soft_labeled_corpus(corpus, teacher.to(device), tokenizer, args, file_hash(args.corpus))
+    teacher.cpu()
+    splits = dataset.train_test_split(test_size=0.1, seed=33)
+
+    student, student_init = build_student(teacher, args)
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        overwrite_output_dir=True,
+        learning_rate=args.learning_rate,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        num_train_epochs=args.epochs,
+        weight_decay=0.01,
+        logging_strategy="epoch",
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        warmup_ratio=0.1,
+        report_to="none",
+        save_total_limit=2,
+        # teacher_logits is not a model input, so the Trainer must not drop it
+        remove_unused_columns=False,
+        use_cpu=args.smoke,
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=splits["train"],
+        eval_dataset=splits["test"],
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+        temperature=args.temperature,
+        alpha=args.alpha,
+    )
+    trainer.train()
+    trainer.save_model(args.output_dir)
+
+    # Compare both models on CPU, where they are served
+    student = AutoModelForSequenceClassification.from_pretrained(args.output_dir)
+    eval_df = load_labeled_csv(args.eval_data, args.eval_sep, args.eval_text_column, args.eval_label_column,
+                               max_samples=SMOKE_EVAL_SAMPLES if args.smoke else None)
+    torch.set_num_threads(args.threads)
+    teacher_report, teacher_preds = model_summary(teacher, tokenizer, eval_df, args)
+    student_report, student_preds = model_summary(student, tokenizer, eval_df, args)
+
+    report = {
+        "teacher": {"model": args.teacher, **teacher_report},
+        "student": {"model": args.output_dir, "init": student_init, **student_report},
+        "agreement": float((teacher_preds == student_preds).mean()),
+        "speedup": student_report["tweets_per_second"] / teacher_report["tweets_per_second"],
+        "threads": args.threads,
+        "eval_samples": len(eval_df),
+    }
+    with open(os.path.join(args.output_dir, "distillation_report.json"), "w") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
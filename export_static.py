@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import io
+import json
+import os
+
+import pandas as pd
+from dotenv import load_dotenv
+from matplotlib import pyplot as plt
+
+import app
+from bundles import (
+    BUNDLE_DIR,
+    BUNDLE_FORMAT,
+    HASHED_NAME,
+    data_version,
+    date_presets,
+    externalize_datasets,
+    load_manifest,
+    save_manifest,
+    write_hashed,
+)
+from timeseries import (
+    downsample,
+    emotion_buckets,
+    emotion_series,
+    pick_granularity,
+    render_trends_html,
+    to_compact_payload,
+)
+
+VERSION_COLUMNS = ['_id', 'created_at', 'label', 'location', 'confidence']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-render dashboard bundles for common date ranges")
+    parser.add_argument("--output-dir", default=BUNDLE_DIR,
+                        help="Directory under ./static, the app links to the png and json files through their static url")
+    parser.add_argument("--force", action="store_true", help="Regenerate even if the data version is unchanged")
+    return parser.parse_args()
+
+
+def write_spec(output_dir, name, chart, datasets):
+    spec, paths = externalize_datasets(chart.to_dict(), output_dir, name)
+    datasets.extend(paths)
+    return write_hashed(output_dir, name, 'vl.json', json.dumps(spec))
+
+
+def render_preset(df, buckets, start_date, end_date, output_dir):
+    created_at = pd.to_datetime(df['created_at']).dt.date
+    filtered_df = df[(created_at >= start_date) & (created_at <= end_date)]
+
+    granularity = pick_granularity(start_date, end_date)
+    trend_series = downsample(emotion_series(buckets, start_date, end_date, granularity))
+    map_data = app.map_data_manipulation(filtered_df)
+
+    fig = app.wordcloud_figure(" ".join(tweet for tweet in filtered_df['full_text']))
+
+    data = {
+        'tweets': len(filtered_df),
+        'label_counts': filtered_df['label'].value_counts().to_dict(),
+        'map': map_data.to_dict(orient='records'),
+        'trends': to_compact_payload(trend_series),
+    }
+    datasets = []
+    files = {
+        'map': write_hashed(output_dir, 'map', 'html', app.build_map(map_data).get_root().render()),
+        'trends': write_spec(output_dir, 'trends', app.tweet_trends(trend_series, granularity), datasets),
+        'trends_d3': write_hashed(output_dir, 'trends_d3', 'html', render_trends_html(trend_series)),
+        'emotions': write_spec(output_dir, 'emotions', app.emotion_distribusion(filtered_df), datasets),
+        'word_count': write_spec(output_dir, 'word_count', app.word_count_distribution(filtered_df), datasets),
+        'data': write_hashed(output_dir, 'data', 'json', json.dumps(data, default=str)),
+    }
+    # Presets without any word to plot get no word cloud, the app shows a notice instead
+    if fig is not None:
+        wordcloud_png = io.BytesIO()
+        fig.savefig(wordcloud_png, format='png')
+        plt.close(fig)
+        files['wordcloud'] = write_hashed(output_dir, 'wordcloud', 'png', wordcloud_png.getvalue())
+    return {'start': start_date.isoformat(), 'end': end_date.isoformat(), 'files': files, 'datasets': datasets}
+
+
+def remove_unreferenced(output_dir, manifest):
+    referenced = {os.path.basename(path) for preset in manifest['presets'].values()
+                  for path in [*preset['files'].values(), *preset['datasets']]}
+    for name in os.listdir(output_dir):
+        # Only files this exporter wrote are removed, anything else in the directory is left alone
+        if HASHED_NAME.match(name) and name not in referenced:
+            os.remove(os.path.join(output_dir, name))
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = os.path.join(args.output_dir, 'manifest.json')
+
+    df = app.get_data()
+    version = data_version(df, [col for col in VERSION_COLUMNS if col in df.columns])
+    manifest = load_manifest(manifest_path)
+    if manifest and manifest['data_version'] == version and not args.force:
+        print(f"Bundles are up to date (data version {version})")
+        return
+
+    min_date, max_date = app.data_bounds(df)
+    buckets = emotion_buckets(df)
+
+    presets = {}
+    for name, (start_date, end_date) in date_presets(min_date, max_date).items():
+        print(f"Rendering {name} ({start_date} - {end_date})")
+        presets[name] = render_preset(df, buckets, start_date, end_date, args.output_dir)
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'data_version': version,
+        'fingerprint': app.get_data_fingerprint(),
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'min_date': min_date.isoformat(),
+        'max_date': max_date.isoformat(),
+        'presets': presets,
+    }
+    save_manifest(manifest, manifest_path)
+    remove_unreferenced(args.output_dir, manifest)
+    print(f"Wrote {len(presets)} presets to {args.output_dir} (data version {version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+MAX_LENGTH = 128
+BATCH_SIZE = 32
+CHUNK_SIZE = 1000
+# Prefixed so predictions never overwrite columns of the uploaded file
+LABEL_COLUMN = 'predicted_label'
+SCORE_COLUMN = 'predicted_score'
+
+
+def label_names(model):
+    # Class names in the same order as the model's output logits
+    return [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+
+def predict_logits(texts, model, tokenizer, batch_size=BATCH_SIZE, max_length=MAX_LENGTH):
+    texts = [str(text) for text in texts]
+    logits = np.zeros((len(texts), model.config.num_labels), dtype=np.float32)
+    if not texts:
+        return logits
+
+    # Sort by length so each batch pads to similar sizes, then write back in the original order
+    order = np.argsort([len(text) for text in texts], kind='stable')
+
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_index = order[start:start + batch_size]
+            encoded = tokenizer([texts[i] for i in batch_index],
+                                padding=True,
+                                truncation=True,
+                                max_length=max_length,
+                                return_tensors='pt').to(model.device)
+            logits[batch_index] = model(**encoded).logits.float().cpu().numpy()
+
+    return logits
+
+
+def predict_proba(texts, model, tokenizer, batch_size=BATCH_SIZE, max_length=MAX_LENGTH):
+    logits = predict_logits(texts, model, tokenizer, batch_size=batch_size, max_length=max_length)
+    return torch.softmax(torch.from_numpy(logits), dim=-1).numpy()
+
+
+def predict_labels(texts, model, tokenizer, batch_size=BATCH_SIZE, max_length=MAX_LENGTH):
+    probs = predict_proba(texts, model, tokenizer, batch_size=batch_size, max_length=max_length)
+    labels = np.array(label_names(model), dtype=object)
+    return labels[probs.argmax(axis=1)], probs.max(axis=1)
+
+
+def measure_throughput(texts, model, tokenizer, batch_size=BATCH_SIZE, max_length=MAX_LENGTH):
+    # One warm-up batch so lazy initialization is not counted
+    predict_logits(texts[:batch_size], model, tokenizer, batch_size=batch_size, max_length=max_length)
+    start = time.perf_counter()
+    predict_logits(texts, model, tokenizer, batch_size=batch_size, max_length=max_length)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def iter_labeled_chunks(file, model, tokenizer, text_column, chunksize=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    # Parse and score the CSV one chunk at a time
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        if text_column not in chunk.columns:
+            raise KeyError(f"Kolom '{text_column}' tidak ditemukan pada file")
+        existing = [col for col in (LABEL_COLUMN, SCORE_COLUMN) if col in chunk.columns]
+        if existing:
+            raise ValueError(f"File sudah memiliki kolom {existing}")
+        texts = chunk[text_column].fillna('').astype(str).tolist()
+        labels, scores = predict_labels(texts, model, tokenizer, batch_size=batch_size)
+        chunk[LABEL_COLUMN] = labels
+        chunk[SCORE_COLUMN] = scores
+        yield chunk
+
+
+def encode_probs(probs):
+    # Each row is packed into a fixed-width float16 block (2 bytes per class)
+    block = np.ascontiguousarray(probs, dtype='<f2')
+    return [row.tobytes() for row in block]
+
+
+def decode_probs(blocks, num_labels):
+    return np.frombuffer(b''.join(blocks), dtype='<f2').reshape(-1, num_labels)
@@ -0,0 +1,92 @@
+import argparse
+import datetime
+import os
+
+from bson.binary import Binary
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from inference import BATCH_SIZE, CHUNK_SIZE, encode_probs, label_names, predict_proba
+
+PRETRAINED = "arthd24/indobert_emotion_base_V2"
+DATABASE_NAME = "local"
+COLLECTION_NAME = "data-tweet-election-2024-v3"
+META_COLLECTION_NAME = "labeler-meta"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Label tweets and store the full probability vector per tweet")
+    parser.add_argument("--model", default=PRETRAINED)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--text-column", default="full_text")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--relabel", action="store_true",
+                        help="Label every tweet again, not only the ones without stored probabilities")
+    return parser.parse_args()
+
+
+def label_collection(collection, model, tokenizer, text_column, batch_size, chunk_size, relabel):
+    labels = label_names(model)
+    query = {} if relabel else {"probs": {"$exists": False}}
+    cursor = collection.find(query, {text_column: 1}).batch_size(chunk_size)
+
+    labeled = 0
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == chunk_size:
+            labeled += write_chunk(collection, chunk, model, tokenizer, labels, text_column, batch_size)
+            chunk = []
+            print(f"{labeled:,} tweets labeled")
+    if chunk:
+        labeled += write_chunk(collection, chunk, model, tokenizer, labels, text_column, batch_size)
+    print(f"Done, {labeled:,} tweets labeled")
+
+
+def write_chunk(collection, chunk, model, tokenizer, labels, text_column, batch_size):
+    texts = [doc.get(text_column) or "" for doc in chunk]
+    probs = predict_proba(texts, model, tokenizer, batch_size=batch_size)
+    top = probs.argmax(axis=1)
+
+    updates = [
+        UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "label": labels[index],
+            "score": float(prob[index]),
+            "probs": Binary(block),
+        }})
+        for doc, prob, index, block in zip(chunk, probs, top, encode_probs(probs))
+    ]
+    collection.bulk_write(updates, ordered=False)
+    return len(updates)
+
+
+def main():
+    load_dotenv()
+    args = parse_args()
+
+    model = AutoModelForSequenceClassification.from_pretrained(args.model)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+
+    db = MongoClient(os.environ.get("MONGO_URI"))[DATABASE_NAME]
+
+    # The column order of the stored vectors is recorded once per collection
+    db[META_COLLECTION_NAME].update_one(
+        {"_id": args.collection},
+        {"$set": {"labels": label_names(model), "model": args.model, "dtype": "float16"}},
+        upsert=True,
+    )
+    try:
+        label_collection(db[args.collection], model, tokenizer, args.text_column,
+                         args.batch_size, args.chunk_size, args.relabel)
+    finally:
+        # Labels are rewritten in place, the dashboard compares this time to find out its bundles are stale
+        db[META_COLLECTION_NAME].update_one(
+            {"_id": args.collection},
+            {"$set": {"labeled_at": datetime.datetime.now(datetime.timezone.utc)}},
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def confusion_matrix(y_true, y_pred, num_labels):
+    # Rows are true labels, columns are predicted labels
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    counts = np.bincount(y_true * num_labels + y_pred, minlength=num_labels * num_labels)
+    return counts.reshape(num_labels, num_labels)
+
+
+def classification_metrics(y_true, y_pred, num_labels):
+    cm = confusion_matrix(y_true, y_pred, num_labels)
+    true_positive = np.diag(cm).astype(np.float64)
+    predicted = cm.sum(axis=0)
+    actual = cm.sum(axis=1)
+
+    precision = np.divide(true_positive, predicted, out=np.zeros_like(true_positive), where=predicted > 0)
+    recall = np.divide(true_positive, actual, out=np.zeros_like(true_positive), where=actual > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros_like(true_positive), where=(precision + recall) > 0)
+
+    total = cm.sum()
+    accuracy = true_positive.sum() / total if total else 0.0
+    return {
+        "accuracy": float(accuracy),
+        # For single-label classification micro precision, recall and F1 all equal accuracy
+        "f1_micro": float(accuracy),
+        "f1_macro": float(f1.mean()),
+        "precision_macro": float(precision.mean()),
+        "recall_macro": float(recall.mean()),
+        "f1_per_label": f1.tolist(),
+        "confusion_matrix": cm.tolist(),
+    }
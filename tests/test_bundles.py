@@ -0,0 +1,62 @@
+import datetime
+import json
+import os
+
+from bundles import (
+    HASHED_NAME,
+    date_presets,
+    default_date_range,
+    externalize_datasets,
+    find_preset,
+    resolve_data_urls,
+    static_url,
+)
+
+
+def test_default_range_starts_in_the_data_year():
+    start, end = default_date_range(datetime.date(2023, 11, 20), datetime.date(2024, 4, 5))
+    assert (start, end) == (datetime.date(2024, 1, 1), datetime.date(2024, 4, 5))
+
+
+def test_default_range_clamped_to_first_tweet():
+    start, _ = default_date_range(datetime.date(2024, 2, 10), datetime.date(2024, 4, 5))
+    assert start == datetime.date(2024, 2, 10)
+
+
+def test_date_presets_cover_each_month():
+    presets = date_presets(datetime.date(2024, 2, 10), datetime.date(2024, 4, 5))
+    assert presets['all-time'] == (datetime.date(2024, 2, 10), datetime.date(2024, 4, 5))
+    assert presets['last-7-days'] == (datetime.date(2024, 3, 30), datetime.date(2024, 4, 5))
+    assert presets['month-2024-02'] == (datetime.date(2024, 2, 10), datetime.date(2024, 2, 29))
+    assert presets['month-2024-03'] == (datetime.date(2024, 3, 1), datetime.date(2024, 3, 31))
+    assert presets['month-2024-04'] == (datetime.date(2024, 4, 1), datetime.date(2024, 4, 5))
+
+
+def test_find_preset_matches_exact_range():
+    manifest = {'presets': {'all-time': {'start': '2024-02-10', 'end': '2024-04-05', 'files': {}}}}
+    assert find_preset(manifest, datetime.date(2024, 2, 10), datetime.date(2024, 4, 5)) is not None
+    assert find_preset(manifest, datetime.date(2024, 2, 11), datetime.date(2024, 4, 5)) is None
+
+
+def test_externalize_datasets_links_spec_to_data_file(tmp_path):
+    spec = {'data': {'name': 'data-1'}, 'mark': 'bar', 'datasets': {'data-1': [{'label': 'Joy', 'count': 3}]}}
+    spec, paths = externalize_datasets(spec, str(tmp_path), 'emotions')
+    assert 'datasets' not in spec
+    assert spec['data'] == {'url': paths[0]}
+    with open(paths[0], encoding='utf-8') as file:
+        assert json.load(file) == [{'label': 'Joy', 'count': 3}]
+
+
+def test_static_url_maps_bundle_path(monkeypatch):
+    path = os.path.join('static', 'bundles', 'map.abc.html')
+    monkeypatch.delenv('STATIC_BASE_URL', raising=False)
+    assert static_url(path) == 'app/static/bundles/map.abc.html'
+    monkeypatch.setenv('STATIC_BASE_URL', 'https://cdn.example.com/')
+    assert resolve_data_urls({'data': {'url': path}}) == {'data': {'url': 'https://cdn.example.com/bundles/map.abc.html'}}
+
+
+def test_hashed_name_matches_only_exported_files(tmp_path):
+    path = externalize_datasets({'datasets': {'data-1': []}}, str(tmp_path), 'trends')[1][0]
+    assert HASHED_NAME.match(os.path.basename(path))
+    assert not HASHED_NAME.match('manifest.json')
+    assert not HASHED_NAME.match('logo.png')
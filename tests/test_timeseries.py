@@ -0,0 +1,73 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from timeseries import CHART_POINTS, downsample, emotion_buckets, emotion_series, lttb, pick_granularity
+
+
+def make_buckets():
+    df = pd.DataFrame({
+        'created_at': ['2024-02-01 08:15', '2024-02-01 08:45', '2024-02-01 13:00', '2024-02-03 09:30'],
+        'label': ['Joy', 'Anger', 'Joy', 'Neutral'],
+    })
+    return emotion_buckets(df)
+
+
+def test_pick_granularity_short_range_is_hourly():
+    assert pick_granularity(datetime.date(2024, 2, 1), datetime.date(2024, 2, 7)) == 'h'
+
+
+def test_pick_granularity_four_month_range_is_daily():
+    assert pick_granularity(datetime.date(2024, 2, 1), datetime.date(2024, 6, 3)) == 'D'
+
+
+def test_pick_granularity_multi_year_range_is_weekly():
+    assert pick_granularity(datetime.date(2010, 1, 1), datetime.date(2024, 1, 1)) == 'W'
+
+
+def test_emotion_buckets_counts_per_hour_and_label():
+    buckets = make_buckets()
+    assert buckets.loc['2024-02-01 08:00', 'Joy'] == 1
+    assert buckets.loc['2024-02-01 08:00', 'Anger'] == 1
+    assert buckets.loc['2024-02-01 13:00', 'Joy'] == 1
+
+
+def test_emotion_series_daily_totals_and_range():
+    series = emotion_series(make_buckets(), datetime.date(2024, 2, 1), datetime.date(2024, 2, 3), 'D')
+    assert list(series.index.date) == [datetime.date(2024, 2, d) for d in (1, 2, 3)]
+    assert series['total'].tolist() == [3, 0, 1]
+    assert series.loc['2024-02-01', 'Joy'] == 2
+
+
+def test_emotion_series_excludes_tweets_outside_range():
+    series = emotion_series(make_buckets(), datetime.date(2024, 2, 2), datetime.date(2024, 2, 3), 'D')
+    assert series['total'].sum() == 1
+
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    selected = lttb(x, y, 100)
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_spike():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[437] = 50
+    assert 437 in lttb(x, y, 50)
+
+
+def test_lttb_returns_all_points_under_threshold():
+    assert lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+
+
+def test_downsample_reduces_long_hourly_series_to_budget():
+    index = pd.date_range('2024-01-01', periods=24 * 60, freq='h', name='created_at')
+    series = pd.DataFrame({'Joy': np.arange(len(index)), 'Anger': 1}, index=index)
+    series['total'] = series.sum(axis=1)
+    assert pick_granularity(datetime.date(2024, 1, 1), datetime.date(2024, 2, 29)) == 'h'
+    assert len(downsample(series)) == CHART_POINTS
@@ -0,0 +1,122 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+CHART_POINTS = 500
+TEMPLATE_PATH = "./template/tweet_trends.html"
+DATA_PLACEHOLDER = "{{ data }}"
+
+# A granularity is used while its bucket count stays within this multiple of CHART_POINTS,
+# LTTB then reduces the series to CHART_POINTS
+OVERSAMPLING = 4
+GRANULARITIES = [
+    ('h', pd.Timedelta(hours=1)),
+    ('D', pd.Timedelta(days=1)),
+    ('W', pd.Timedelta(weeks=1)),
+]
+
+GRANULARITY_TITLES = {
+    'h': 'Jam',
+    'D': 'Tanggal',
+    'W': 'Minggu',
+}
+
+
+def emotion_buckets(df):
+    # Hourly tweet counts per emotion, the finest granularity every chart is built from
+    created_at = pd.to_datetime(df['created_at'])
+    buckets = df.groupby([created_at.dt.floor('h'), df['label']]).size().unstack(fill_value=0)
+    buckets.index.name = 'created_at'
+    buckets.columns = [str(col) for col in buckets.columns]
+    return buckets.sort_index()
+
+
+def pick_granularity(start_date, end_date, max_points=CHART_POINTS):
+    # Finest granularity whose bucket count stays within the oversampled chart budget
+    span = pd.Timestamp(end_date) - pd.Timestamp(start_date) + pd.Timedelta(days=1)
+    for granularity, bucket in GRANULARITIES:
+        if span / bucket <= max_points * OVERSAMPLING:
+            return granularity
+    return GRANULARITIES[-1][0]
+
+
+def emotion_series(buckets, start_date, end_date, granularity=None):
+    granularity = granularity or pick_granularity(start_date, end_date)
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+
+    index = buckets.index
+    if index.tz is not None:
+        start, end = start.tz_localize(index.tz), end.tz_localize(index.tz)
+    window = buckets[(index >= start) & (index < end)]
+
+    series = window.resample(granularity).sum()
+    series['total'] = series.sum(axis=1)
+    return series
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of the points that best keep the shape of y."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = np.zeros(threshold, dtype=int)
+    previous = 0
+    for i in range(threshold - 2):
+        bucket_start, bucket_end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Keep the point that forms the largest triangle with the previous pick and the next bucket average
+        area = np.abs((x[previous] - avg_x) * (y[bucket_start:bucket_end] - y[previous])
+                      - (x[previous] - x[bucket_start:bucket_end]) * (avg_y - y[previous]))
+        previous = bucket_start + int(area.argmax())
+        selected[i + 1] = previous
+
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample(series, max_points=CHART_POINTS):
+    if len(series) <= max_points:
+        return series
+    x = series.index.asi8
+    return series.iloc[lttb(x, series['total'].to_numpy(), max_points)]
+
+
+def to_long_format(series):
+    long_df = series.drop(columns='total').reset_index().melt(id_vars='created_at',
+                                                               var_name='label',
+                                                               value_name='count')
+    return long_df
+
+
+def to_compact_payload(series):
+    # Column-oriented arrays: one timestamp list plus one count list per emotion
+    labels = [col for col in series.columns if col != 'total']
+    return {
+        't': series.index.as_unit('ms').asi8.tolist(),
+        'labels': labels,
+        'v': [series[label].astype(int).tolist() for label in labels],
+    }
+
+
+@lru_cache(maxsize=1)
+def load_trends_template(path=TEMPLATE_PATH):
+    with open(path, "r") as file:
+        head, tail = file.read().split(DATA_PLACEHOLDER, 1)
+    return head, tail
+
+
+def render_trends_html(series):
+    head, tail = load_trends_template()
+    data = json.dumps(to_compact_payload(series), separators=(',', ':')).replace('<', '\\u003c')
+    return head + data + tail
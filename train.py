@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from datasets import Dataset, load_from_disk
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    BertConfig,
+    DataCollatorWithPadding,
+    Trainer,
+    TrainingArguments,
+)
+
+from inference import predict_proba
+from metrics import classification_metrics
+
+BASE_MODEL = "indolem/indobert-base-uncased"
+MAX_LENGTH = 60
+CACHE_DIR = ".cache/tokenized"
+
+# Reduced settings so the whole pipeline runs on CPU in a couple of minutes
+SMOKE_SAMPLES = 256
+SMOKE_MODEL = dict(num_hidden_layers=2, hidden_size=64, num_attention_heads=2, intermediate_size=128)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fine-tune an emotion classifier on a labeled tweet CSV")
+    parser.add_argument("--data", required=True, help="Labeled CSV with a text and a label column")
+    parser.add_argument("--sep", default="\t")
+    parser.add_argument("--text-column", default="Tweet")
+    parser.add_argument("--label-column", default="Label")
+    parser.add_argument("--model", default=BASE_MODEL)
+    parser.add_argument("--output-dir", default="indobert_emotion_base_V2")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=33)
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count())
+    parser.add_argument("--epochs", type=float, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=5e-5)
+    parser.add_argument("--report-to", default="none")
+    parser.add_argument("--push-to-hub", action="store_true")
+    parser.add_argument("--smoke", action="store_true",
+                        help="Tiny CPU run: few samples, one epoch and a small randomly initialized model")
+    return parser.parse_args()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def tokenizer_hash(tokenizer):
+    vocab = json.dumps(sorted(tokenizer.get_vocab().items()))
+    return hashlib.sha256(f"{tokenizer.name_or_path}|{type(tokenizer).__name__}|{vocab}".encode()).hexdigest()
+
+
+def load_labeled_csv(path, sep, text_column, label_column, max_samples=None):
+    df = pd.read_csv(path, sep=sep, encoding="utf-8", usecols=[text_column, label_column])
+    df = df.dropna().rename(columns={text_column: "text", label_column: "label_name"})
+    df["text"] = df["text"].astype(str)
+    df["label_name"] = df["label_name"].astype(str)
+    if max_samples:
+        df = df.sample(n=min(max_samples, len(df)), random_state=0)
+    return df.reset_index(drop=True)
+
+
+def tokenized_splits(df, tokenizer, args, data_hash):
+    # Same data, columns, tokenizer and split settings always map to the same cache entry.
+    # The smoke sample is shuffled, so it never shares an entry with a full run on the same file
+    settings = [args.sep, args.text_column, args.label_column, args.max_length, args.test_size, args.seed,
+                args.smoke, len(df)]
+    key = hashlib.sha256(
+        f"{data_hash}|{tokenizer_hash(tokenizer)}|{json.dumps(settings)}".encode()
+    ).hexdigest()[:16]
+    path = os.path.join(args.cache_dir, key)
+    if os.path.isdir(path):
+        print(f"Using cached tokenized dataset {path}")
+        return load_cached_splits(path)
+
+    label_names = sorted(df["label_name"].unique())
+    label2id = {label: i for i, label in enumerate(label_names)}
+    df = df.assign(label=df["label_name"].map(label2id))
+
+    dataset = Dataset.from_pandas(df[["text", "label"]], preserve_index=False)
+    splits = dataset.train_test_split(test_size=args.test_size, seed=args.seed)
+
+    def preprocess_fn(data):
+        return tokenizer(data["text"], max_length=args.max_length, truncation=True)
+
+    num_proc = args.num_proc if args.num_proc and args.num_proc > 1 else None
+    splits = splits.map(preprocess_fn, batched=True, num_proc=num_proc)
+
+    # Write to a temporary directory first so an interrupted run never leaves a partial cache entry
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    splits.save_to_disk(tmp_path)
+    with open(os.path.join(tmp_path, "label_names.json"), "w") as file:
+        json.dump(label_names, file)
+    os.replace(tmp_path, path)
+    return load_cached_splits(path)
+
+
+def load_cached_splits(path):
+    # load_from_disk memory-maps the Arrow files instead of reading them into RAM
+    with open(os.path.join(path, "label_names.json")) as file:
+        label_names = json.load(file)
+    return load_from_disk(path), label_names
+
+
+def build_model(args, tokenizer, id2label):
+    label2id = {label: i for i, label in id2label.items()}
+    if args.smoke:
+        config = BertConfig(vocab_size=len(tokenizer), num_labels=len(id2label),
+                            id2label=id2label, label2id=label2id, **SMOKE_MODEL)
+        return AutoModelForSequenceClassification.from_config(config)
+    return AutoModelForSequenceClassification.from_pretrained(
+        args.model, num_labels=len(id2label), id2label=id2label, label2id=label2id
+    )
+
+
+def compute_metrics(eval_pred):
+    logits, labels = eval_pred
+    predictions = np.argmax(logits, axis=1)
+    scores = classification_metrics(labels, predictions, logits.shape[1])
+    return {key: scores[key] for key in ("accuracy", "f1_micro", "f1_macro")}
+
+
+def evaluate_batched(model, tokenizer, dataset, batch_size, max_length):
+    probs = predict_proba(dataset["text"], model, tokenizer, batch_size=batch_size, max_length=max_length)
+    return classification_metrics(dataset["label"], probs.argmax(axis=1), model.config.num_labels)
+
+
+def main():
+    args = parse_args()
+    if args.smoke:
+        args.epochs = 1
+        args.batch_size = 8
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    df = load_labeled_csv(args.data, args.sep, args.text_column, args.label_column,
+                          max_samples=SMOKE_SAMPLES if args.smoke else None)
+    splits, label_names = tokenized_splits(df, tokenizer, args, file_hash(args.data))
+    id2label = dict(enumerate(label_names))
+
+    model = build_model(args, tokenizer, id2label)
+    training_args = TrainingArguments(
+        output_dir=args.output_dir,
+        overwrite_output_dir=True,
+        learning_rate=args.learning_rate,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
+        num_train_epochs=args.epochs,
+        weight_decay=0.01,
+        logging_strategy="epoch",
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        load_best_model_at_end=True,
+        push_to_hub=args.push_to_hub,
+        warmup_ratio=0.1,
+        metric_for_best_model="accuracy",
+        report_to=args.report_to,
+        save_total_limit=2,
+        seed=args.seed,
+        use_cpu=args.smoke,
+    )
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=splits["train"],
+        eval_dataset=splits["test"],
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+        compute_metrics=compute_metrics,
+    )
+    trainer.train()
+    trainer.save_model(args.output_dir)
+
+    results = evaluate_batched(trainer.model, tokenizer, splits["test"], args.batch_size * 2, args.max_length)
+    with open(os.path.join(args.output_dir, "eval_results.json"), "w") as file:
+        json.dump({"labels": label_names, **results}, file, indent=2)
+    print(json.dumps({key: results[key] for key in ("accuracy", "f1_micro", "f1_macro")}, indent=2))
+
+    if args.push_to_hub:
+        trainer.push_to_hub()
+
+
+if __name__ == "__main__":
+    main()